@@ -6,17 +6,21 @@ FastAPI server for InfiniteTalk video generation with queue management
 import os
 import sys
 import asyncio
+import time
 import uuid
-import json
+import hashlib
 from pathlib import Path
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Set, Tuple
 from datetime import datetime
 
+import aiofiles
+import orjson
 import uvicorn
 from fastapi import FastAPI, UploadFile, File, Form, HTTPException, WebSocket, WebSocketDisconnect
 from fastapi.templating import Jinja2Templates
-from fastapi.responses import HTMLResponse, FileResponse
+from fastapi.responses import HTMLResponse, FileResponse, ORJSONResponse, Response
 from fastapi.requests import Request
+from fastapi.middleware.gzip import GZipMiddleware
 from pydantic import BaseModel
 
 # Add parent directory to path to import InfiniteTalk modules
@@ -24,42 +28,224 @@ sys.path.append(str(Path(__file__).parent.parent))
 
 from queue_manager import QueueManager
 from video_processor import VideoProcessor
+from output_cache import OutputCache
 
 # Initialize FastAPI app
-app = FastAPI(title="InfiniteTalk API", description="Audio-driven video generation with lightx2v acceleration")
+app = FastAPI(
+    title="InfiniteTalk API",
+    description="Audio-driven video generation with lightx2v acceleration",
+    default_response_class=ORJSONResponse
+)
+
+class JSONGZipMiddleware(GZipMiddleware):
+    """GZip responses except video downloads, which are already compressed"""
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and scope["path"].startswith("/api/result/"):
+            await self.app(scope, receive, send)
+            return
+        await super().__call__(scope, receive, send)
+
+# Compress the highly repetitive JSON status payloads
+app.add_middleware(JSONGZipMiddleware, minimum_size=512)
 
 # Mount templates
 templates = Jinja2Templates(directory="api/templates")
 
 # Initialize queue manager and video processor
 queue_manager = QueueManager(max_queue_size=20, max_concurrent=3)
-video_processor = VideoProcessor()
+video_processor = VideoProcessor(
+    in_process=os.getenv("INFINITETALK_IN_PROCESS") == "1",
+    dit_quant=os.getenv("INFINITETALK_DIT_QUANT") or None,
+    quant_dir=os.getenv("INFINITETALK_QUANT_DIR") or None,
+    streaming_budget_gb=(
+        None if os.getenv("INFINITETALK_VRAM_RESERVE_GB") == "stream"
+        else float(os.getenv("INFINITETALK_VRAM_RESERVE_GB", "12"))
+    ),
+    weights_cache_dir=os.getenv("INFINITETALK_WEIGHTS_CACHE_DIR") or None,
+    weights_cache_gb=float(os.getenv("INFINITETALK_WEIGHTS_CACHE_GB", "200"))
+)
+
+# Finished videos keyed by (prompt, image, audio, generation settings), so
+# repeated requests skip the GPU
+output_cache = OutputCache(
+    "cache/outputs",
+    max_bytes=int(float(os.getenv("INFINITETALK_OUTPUT_CACHE_GB", "20")) * (1 << 30))
+)
+OUTPUT_CACHE_SETTINGS = " ".join(video_processor.worker_args)
+
+# Accepted upload file types
+IMAGE_EXTS = frozenset({'.jpg', '.jpeg', '.png', '.bmp', '.gif'})
+AUDIO_EXTS = frozenset({'.wav', '.mp3', '.flac', '.aac', '.ogg'})
+
+# Read/write size used when streaming uploads to disk
+UPLOAD_CHUNK_SIZE = 1 << 20
+
+# Heartbeat sent by the web UI and the prebuilt reply to it
+PING = b'{"type":"ping"}'
+PONG = b'{"type":"pong"}'
+
+# Sent by clients that want the full queue listing on every queue change
+SUBSCRIBE_QUEUE = b'{"type":"subscribe_queue"}'
+
+# Number of clients sent to concurrently before yielding to the event loop
+BROADCAST_BATCH_SIZE = 50
 
 # WebSocket connection manager
 class ConnectionManager:
     def __init__(self):
         self.active_connections: List[WebSocket] = []
+        # Connections that asked for full queue listings on every change;
+        # everyone else only gets counters
+        self.queue_subscribers: Set[WebSocket] = set()
 
     async def connect(self, websocket: WebSocket):
         await websocket.accept()
         self.active_connections.append(websocket)
 
     def disconnect(self, websocket: WebSocket):
-        self.active_connections.remove(websocket)
+        if websocket in self.active_connections:
+            self.active_connections.remove(websocket)
+        self.queue_subscribers.discard(websocket)
 
-    async def send_personal_message(self, message: str, websocket: WebSocket):
-        await websocket.send_text(message)
+    def subscribe_queue(self, websocket: WebSocket):
+        self.queue_subscribers.add(websocket)
 
-    async def broadcast(self, message: str):
-        for connection in self.active_connections:
-            try:
-                await connection.send_text(message)
-            except:
-                # Remove dead connections
-                self.active_connections.remove(connection)
+    async def send_personal_message(self, message: bytes, websocket: WebSocket):
+        await websocket.send_bytes(message)
+
+    async def broadcast(self, message: bytes, connections: Optional[List[WebSocket]] = None):
+        # Snapshot the list so connects/disconnects during the awaits below
+        # don't mutate what we're iterating over
+        clients = list(self.active_connections if connections is None else connections)
+        dead = []
+        for i in range(0, len(clients), BROADCAST_BATCH_SIZE):
+            batch = clients[i:i + BROADCAST_BATCH_SIZE]
+            results = await asyncio.gather(
+                *(connection.send_bytes(message) for connection in batch),
+                return_exceptions=True
+            )
+            dead.extend(c for c, r in zip(batch, results) if isinstance(r, Exception))
+            # Let HTTP handlers run between batches
+            await asyncio.sleep(0)
+
+        # Remove dead connections
+        for connection in dead:
+            self.disconnect(connection)
 
 manager = ConnectionManager()
 
+# Set whenever queue state changes; queue_broadcaster coalesces bursts of
+# changes into a single queue_update broadcast
+queue_dirty = asyncio.Event()
+QUEUE_BROADCAST_DELAY = 0.05
+
+async def queue_broadcaster():
+    """
+    Background task that broadcasts queue state once per burst of changes.
+
+    Subscribed clients get the full queue_update; the rest get the cheap
+    queue_counters message.
+    """
+    while True:
+        await queue_dirty.wait()
+        # Give closely spaced state changes a chance to land in the same payload
+        await asyncio.sleep(QUEUE_BROADCAST_DELAY)
+        queue_dirty.clear()
+        try:
+            subscribers, others = [], []
+            for connection in manager.active_connections:
+                (subscribers if connection in manager.queue_subscribers else others).append(connection)
+            if subscribers:
+                await manager.broadcast(await get_queue_update_message(), subscribers)
+            if others:
+                await manager.broadcast(get_queue_counters_message(), others)
+        except Exception as e:
+            print(f"Queue broadcast failed: {str(e)}")
+
+@app.on_event("startup")
+async def start_queue_broadcaster():
+    """Start the coalescing queue_update broadcaster"""
+    app.state.queue_broadcaster = asyncio.create_task(queue_broadcaster())
+
+@app.on_event("startup")
+async def start_processing_workers():
+    """Start one processing worker per concurrent processing slot"""
+    app.state.processing_workers = [
+        asyncio.create_task(processing_worker())
+        for _ in range(queue_manager.max_concurrent)
+    ]
+
+def _sweep_uploads_sync(keep: Set[str], max_age_hours: int) -> int:
+    """Remove uploads and leftover .part files not touched for max_age_hours, except keep"""
+    cutoff = time.time() - max_age_hours * 3600
+    removed = 0
+    for root, _, names in os.walk("uploads"):
+        for name in names:
+            path = os.path.join(root, name)
+            if path in keep:
+                continue
+            try:
+                if os.stat(path).st_mtime < cutoff:
+                    os.remove(path)
+                    removed += 1
+            except FileNotFoundError:
+                pass
+    return removed
+
+async def cleanup_loop():
+    """Periodically drop completed/failed requests and unused uploads older than a day"""
+    while True:
+        await asyncio.sleep(3600)
+        queue_manager.cleanup_old_requests(max_age_hours=24)
+        
+        # Uploads are shared between identical requests, so they are swept
+        # by age (re-uploading refreshes the mtime) rather than deleted per
+        # request; inputs of requests still waiting or running are kept
+        active = (queue_manager.get_all_requests()
+                  + queue_manager.get_preparing_requests()
+                  + queue_manager.get_processing_requests())
+        keep = {item[key] for item in active for key in ("image_path", "audio_path")}
+        try:
+            removed = await asyncio.to_thread(_sweep_uploads_sync, keep, 24)
+            if removed:
+                print(f"Removed {removed} unused uploads")
+        except Exception as e:
+            print(f"Upload cleanup failed: {str(e)}")
+
+@app.on_event("startup")
+async def start_cleanup_loop():
+    """Start the periodic cleanup of old requests"""
+    app.state.cleanup_loop = asyncio.create_task(cleanup_loop())
+
+async def start_model_worker():
+    """Prefetch weights and load the models in the background so startup isn't blocked"""
+    try:
+        await video_processor.ensure_weights()
+        await video_processor.prefetch_weights()
+        await video_processor.start()
+        if os.getenv("INFINITETALK_WARMUP", "1") == "1":
+            await video_processor.warmup()
+    except Exception as e:
+        # Jobs retry the start, so keep serving
+        print(f"Model worker failed to start: {str(e)}")
+
+@app.on_event("startup")
+async def start_video_processor():
+    """Start the resident model worker"""
+    app.state.model_worker_start = asyncio.create_task(start_model_worker())
+
+@app.on_event("shutdown")
+async def stop_video_processor():
+    """Stop the resident model worker"""
+    await video_processor.stop()
+
+@app.on_event("startup")
+async def log_event_loop():
+    """Report which event loop implementation uvicorn selected"""
+    loop_cls = type(asyncio.get_running_loop())
+    print(f"Event loop: {loop_cls.__module__}.{loop_cls.__name__}")
+
 # Pydantic models
 class ProcessingRequest(BaseModel):
     request_id: str
@@ -72,11 +258,53 @@ class ProcessingRequest(BaseModel):
 
 class QueueStatus(BaseModel):
     queue_size: int
+    preparing_count: int = 0
     processing_count: int
     max_queue_size: int
     max_concurrent: int
     requests: List[ProcessingRequest]
 
+async def save_upload(upload: UploadFile, tmp_path: str, suffix: str) -> Tuple[str, str]:
+    """
+    Stream an uploaded file into the content-addressed upload store.
+
+    The file is hashed while it is written to tmp_path, then moved to
+    uploads/<digest[:2]>/<digest><suffix>. If that file already exists the
+    temporary copy is discarded, so identical uploads are stored once.
+
+    Returns:
+        Tuple of (stored path, hex digest)
+    """
+    hasher = hashlib.blake2b(digest_size=32)
+    try:
+        async with aiofiles.open(tmp_path, "wb") as f:
+            while chunk := await upload.read(UPLOAD_CHUNK_SIZE):
+                hasher.update(chunk)
+                await f.write(chunk)
+    except BaseException:
+        # Client disconnects and write errors must not leave partial files
+        try:
+            os.remove(tmp_path)
+        except FileNotFoundError:
+            pass
+        raise
+    
+    digest = hasher.hexdigest()
+    path = f"uploads/{digest[:2]}/{digest}{suffix}"
+    await asyncio.to_thread(_commit_upload, tmp_path, path)
+    return path, digest
+
+def _commit_upload(tmp_path: str, path: str):
+    """Move a hashed upload into place unless identical content is already stored"""
+    try:
+        # Identical content already stored: refresh the age the upload
+        # sweep goes by and drop the new copy
+        os.utime(path)
+        os.remove(tmp_path)
+    except FileNotFoundError:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        os.replace(tmp_path, path)
+
 @app.get("/", response_class=HTMLResponse)
 async def read_root(request: Request):
     """Serve the main page"""
@@ -91,17 +319,14 @@ async def generate_video(
     """Submit a video generation request"""
     
     # Validate file types
-    image_extensions = ['.jpg', '.jpeg', '.png', '.bmp', '.gif']
-    audio_extensions = ['.wav', '.mp3', '.flac', '.aac', '.ogg']
-    
     image_ext = Path(image.filename).suffix.lower()
     audio_ext = Path(audio.filename).suffix.lower()
     
-    if image_ext not in image_extensions:
-        raise HTTPException(status_code=400, detail=f"Invalid image file type. Supported: {image_extensions}")
+    if image_ext not in IMAGE_EXTS:
+        raise HTTPException(status_code=400, detail=f"Invalid image file type. Supported: {', '.join(sorted(IMAGE_EXTS))}")
     
-    if audio_ext not in audio_extensions:
-        raise HTTPException(status_code=400, detail=f"Invalid audio file type. Supported: {audio_extensions}")
+    if audio_ext not in AUDIO_EXTS:
+        raise HTTPException(status_code=400, detail=f"Invalid audio file type. Supported: {', '.join(sorted(AUDIO_EXTS))}")
     
     # Check queue capacity
     if queue_manager.get_queue_size() >= queue_manager.max_queue_size:
@@ -110,38 +335,31 @@ async def generate_video(
     # Generate unique request ID
     request_id = str(uuid.uuid4())
     
-    # Save uploaded files
-    image_path = f"uploads/{request_id}_image{Path(image.filename).suffix}"
-    audio_path = f"uploads/{request_id}_audio{Path(audio.filename).suffix}"
-    
-    with open(image_path, "wb") as f:
-        content = await image.read()
-        f.write(content)
-    
-    with open(audio_path, "wb") as f:
-        content = await audio.read()
-        f.write(content)
+    # Save uploaded files, deduplicated by content hash
+    image_path, image_hash = await save_upload(image, f"uploads/{request_id}_image.part", image_ext)
+    audio_path, audio_hash = await save_upload(audio, f"uploads/{request_id}_audio.part", audio_ext)
     
     # Add to queue
     queue_item = {
         "request_id": request_id,
         "image_path": image_path,
         "audio_path": audio_path,
+        "image_hash": image_hash,
+        "audio_hash": audio_hash,
         "prompt": prompt,
         "timestamp": datetime.now().isoformat(),
         "status": "queued"
     }
     
-    queue_manager.add_to_queue(queue_item)
-    
+    # The queue may have filled while the uploads were being saved
+    if not queue_manager.add_to_queue(queue_item):
+        raise HTTPException(status_code=429, detail="Queue is full. Please try again later.")
+
     # Broadcast queue update
-    await manager.broadcast(json.dumps({
-        "type": "queue_update",
-        "data": await get_queue_status_data()
-    }))
+    queue_dirty.set()
     
-    # Start processing if possible
-    asyncio.create_task(process_queue())
+    # Wake a processing worker
+    work_queue.put_nowait(request_id)
     
     return ProcessingRequest(
         request_id=request_id,
@@ -159,87 +377,130 @@ async def get_request_status(request_id: str):
     if not status:
         raise HTTPException(status_code=404, detail="Request not found")
     
-    return ProcessingRequest(
-        request_id=request_id,
-        status=status["status"],
-        message=status.get("message", ""),
-        timestamp=status["timestamp"],
-        position_in_queue=queue_manager.get_queue_position(request_id),
-        estimated_time=status.get("estimated_time"),
-        result_url=status.get("result_url")
-    )
+    # Returning a response directly skips response_model validation of
+    # server-generated data; the model still documents the schema
+    return ORJSONResponse({
+        "request_id": request_id,
+        "status": status["status"],
+        "message": status.get("message", ""),
+        "timestamp": status["timestamp"],
+        "position_in_queue": queue_manager.get_queue_position(request_id),
+        "estimated_time": queue_manager.get_estimated_wait_time(request_id),
+        "result_url": status.get("result_url")
+    })
 
 @app.get("/api/queue", response_model=QueueStatus)
 async def get_queue_status():
     """Get current queue status"""
-    return QueueStatus(**(await get_queue_status_data()))
+    return ORJSONResponse(await get_queue_status_data())
+
+# Queue status payload and its serialized queue_update message, reused until
+# the queue manager's version changes
+_queue_status_cache: Dict[str, Any] = {"version": None, "data": None, "message": None}
 
 async def get_queue_status_data() -> Dict[str, Any]:
     """Helper function to get queue status data"""
-    queue_items = queue_manager.get_all_requests()
-    processing_items = queue_manager.get_processing_requests()
-    
-    requests = []
-    for item in queue_items + processing_items:
-        request_obj = ProcessingRequest(
-            request_id=item["request_id"],
-            status=item["status"],
-            message=item.get("message", ""),
-            timestamp=item["timestamp"],
-            position_in_queue=queue_manager.get_queue_position(item["request_id"]) if item["status"] == "queued" else None,
-            estimated_time=item.get("estimated_time"),
-            result_url=item.get("result_url")
-        )
-        requests.append(request_obj.dict())
-    
+    version = queue_manager.get_version()
+    if _queue_status_cache["version"] != version:
+        _queue_status_cache["data"] = _build_queue_status_data()
+        _queue_status_cache["message"] = None
+        _queue_status_cache["version"] = version
+    return _queue_status_cache["data"]
+
+async def get_queue_update_message() -> bytes:
+    """Get the serialized queue_update WebSocket message for the current state"""
+    data = await get_queue_status_data()
+    if _queue_status_cache["message"] is None:
+        _queue_status_cache["message"] = orjson.dumps({
+            "type": "queue_update",
+            "data": data
+        })
+    return _queue_status_cache["message"]
+
+def get_queue_counters() -> Dict[str, int]:
+    """Get the queue counters without building the per-request listing"""
     return {
         "queue_size": queue_manager.get_queue_size(),
+        "preparing_count": queue_manager.get_preparing_count(),
         "processing_count": queue_manager.get_processing_count(),
         "max_queue_size": queue_manager.max_queue_size,
-        "max_concurrent": queue_manager.max_concurrent,
-        "requests": requests
+        "max_concurrent": queue_manager.max_concurrent
     }
 
+def get_queue_counters_message() -> bytes:
+    """Get the serialized queue_counters WebSocket message"""
+    return orjson.dumps({"type": "queue_counters", "data": get_queue_counters()})
+
+def _build_queue_status_data() -> Dict[str, Any]:
+    """Build the queue status payload from the queue manager"""
+    queue_items = queue_manager.get_all_requests()
+    preparing_items = queue_manager.get_preparing_requests()
+    processing_items = queue_manager.get_processing_requests()
+    
+    # Build plain dicts directly; the data is server-generated so a
+    # ProcessingRequest validation round-trip per item buys nothing
+    requests = [
+        {
+            "request_id": item["request_id"],
+            "status": item["status"],
+            "message": item.get("message", ""),
+            "timestamp": item["timestamp"],
+            "position_in_queue": queue_manager.get_queue_position(item["request_id"]) if item["status"] == "queued" else None,
+            "estimated_time": queue_manager.get_estimated_wait_time(item["request_id"]),
+            "result_url": item.get("result_url")
+        }
+        for item in queue_items + preparing_items + processing_items
+    ]
+    
+    return {**get_queue_counters(), "requests": requests}
+
 @app.get("/api/result/{request_id}")
-async def get_result(request_id: str):
+async def get_result(request_id: str, request: Request):
     """Download the generated video"""
     status = queue_manager.get_request_status(request_id)
     
     if not status or status["status"] != "completed":
         raise HTTPException(status_code=404, detail="Video not ready or request not found")
     
-    video_path = f"outputs/{request_id}.mp4"
-    if not os.path.exists(video_path):
-        raise HTTPException(status_code=404, detail="Video file not found")
+    # Path and stat were recorded when the request completed
+    video_path = status.get("result_path") or f"outputs/{request_id}.mp4"
+    stat_result = status.get("result_stat")
+    if stat_result is None:
+        try:
+            stat_result = await asyncio.to_thread(os.stat, video_path)
+        except FileNotFoundError:
+            raise HTTPException(status_code=404, detail="Video file not found")
+    
+    etag = f'"{stat_result.st_mtime_ns:x}-{stat_result.st_size:x}"'
+    headers = {"ETag": etag, "Cache-Control": "public, max-age=3600"}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
     
     return FileResponse(
         path=video_path,
         media_type="video/mp4",
-        filename=f"infinitetalk_{request_id}.mp4"
+        filename=f"infinitetalk_{request_id}.mp4",
+        headers=headers,
+        stat_result=stat_result
     )
 
+def _delete_files_sync(paths: List[str]):
+    """Remove files, ignoring ones that are already gone"""
+    for path in paths:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
 @app.delete("/api/result/{request_id}")
 async def delete_result(request_id: str):
     """Delete the generated video and associated files"""
     try:
-        # Delete video file
-        video_path = f"outputs/{request_id}.mp4"
-        if os.path.exists(video_path):
-            os.remove(video_path)
-        
-        # Delete uploaded files if they exist
-        for ext in ['.png', '.jpg', '.jpeg', '.wav', '.mp3', '.flac']:
-            image_path = f"uploads/{request_id}_image{ext}"
-            audio_path = f"uploads/{request_id}_audio{ext}"
-            if os.path.exists(image_path):
-                os.remove(image_path)
-            if os.path.exists(audio_path):
-                os.remove(audio_path)
-        
-        # Delete config file
-        config_path = f"uploads/{request_id}_config.json"
-        if os.path.exists(config_path):
-            os.remove(config_path)
+        # Delete the video off the event loop. Uploads live in the
+        # content-addressed store and may be shared, so they stay.
+        status = queue_manager.get_request_status(request_id) or {}
+        paths = [status.get("result_path") or f"outputs/{request_id}.mp4"]
+        await asyncio.to_thread(_delete_files_sync, paths)
         
         # Remove from queue manager if it exists
         queue_manager.remove_request(request_id)
@@ -255,45 +516,55 @@ async def websocket_endpoint(websocket: WebSocket):
     await manager.connect(websocket)
     try:
         # Send initial queue status
-        await websocket.send_text(json.dumps({
-            "type": "queue_update",
-            "data": await get_queue_status_data()
-        }))
+        await websocket.send_bytes(await get_queue_update_message())
         
         # Keep connection alive and listen for client messages
         while True:
-            data = await websocket.receive_text()
-            # Echo back for heartbeat
-            await websocket.send_text(json.dumps({"type": "pong", "data": data}))
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                raise WebSocketDisconnect(message.get("code", 1000))
+            # Binary frames skip the UTF-8 decode; text frames are still accepted
+            data = message.get("bytes") or (message.get("text") or "").encode()
+            
+            # Echo back for heartbeat; plain liveness pings get a prebuilt reply
+            if not data or data == PING:
+                await websocket.send_bytes(PONG)
+            elif data == SUBSCRIBE_QUEUE:
+                # Client wants full queue listings instead of counters
+                manager.subscribe_queue(websocket)
+            else:
+                await websocket.send_bytes(orjson.dumps({"type": "pong", "data": data.decode(errors="replace")}))
             
     except WebSocketDisconnect:
         manager.disconnect(websocket)
 
-async def process_queue():
-    """Background task to process the queue"""
-    while queue_manager.can_start_processing():
-        queue_item = queue_manager.get_next_item()
-        if queue_item:
-            # Start processing
-            queue_manager.start_processing(queue_item["request_id"])
-            
-            # Broadcast status update
-            await manager.broadcast(json.dumps({
-                "type": "status_update",
-                "data": {
-                    "request_id": queue_item["request_id"],
-                    "status": "processing",
-                    "message": "Video generation started"
-                }
-            }))
-            
-            await manager.broadcast(json.dumps({
-                "type": "queue_update",
-                "data": await get_queue_status_data()
-            }))
+# One token per queued request; processing workers block on this instead of
+# being spawned per request
+work_queue: asyncio.Queue = asyncio.Queue()
+
+async def processing_worker():
+    """Long-lived consumer that processes queued requests one at a time"""
+    while True:
+        await work_queue.get()
+        try:
+            # The queue manager owns ordering; a token whose request was
+            # deleted while queued finds nothing (or a later item) here
+            queue_item = queue_manager.get_next_item()
+            if not queue_item:
+                continue
             
-            # Process in background
-            asyncio.create_task(process_video(queue_item))
+            # The request prepares its inputs and waits for the GPU as
+            # "preparing"; it only counts as processing once the model worker
+            # is free, since generation runs one job at a time. process_video
+            # announces the status changes and the debounced queue_update
+            # refreshes positions of the rest.
+            queue_manager.start_preparing(queue_item["request_id"])
+            queue_dirty.set()
+            await process_video(queue_item)
+        except Exception as e:
+            print(f"Processing worker error: {str(e)}")
+        finally:
+            work_queue.task_done()
 
 async def process_video(queue_item: Dict[str, Any]):
     """Process a single video generation request"""
@@ -301,81 +572,92 @@ async def process_video(queue_item: Dict[str, Any]):
     
     try:
         # Update status
-        queue_manager.update_request_status(request_id, "processing", "Initializing models...")
-        await manager.broadcast(json.dumps({
-            "type": "status_update",
-            "data": {
-                "request_id": request_id,
-                "status": "processing",
-                "message": "Initializing models..."
-            }
-        }))
+        queue_manager.update_request_status(request_id, "preparing", "Preparing input files...")
+        await manager.broadcast(status_update_message(request_id, "preparing", "Preparing input files..."))
+        
+        async def on_gpu_start():
+            queue_manager.start_processing(request_id)
+            queue_manager.update_request_status(request_id, "processing", "Generating video...")
+            queue_dirty.set()
+            await manager.broadcast(status_update_message(request_id, "processing", "Generating video..."))
         
         # Create output filename
         output_path = f"outputs/{request_id}.mp4"
         
-        # Process video using InfiniteTalk
-        success = await video_processor.process_video(
-            image_path=queue_item["image_path"],
-            audio_path=queue_item["audio_path"],
-            output_path=output_path,
-            request_id=request_id,
-            prompt=queue_item.get("prompt"),
-            progress_callback=lambda msg: asyncio.create_task(send_progress_update(request_id, msg))
+        cache_key = OutputCache.make_key(
+            queue_item.get("prompt"), queue_item["image_hash"], queue_item["audio_hash"],
+            OUTPUT_CACHE_SETTINGS
         )
         
+        if await asyncio.to_thread(output_cache.lookup, cache_key, output_path):
+            await send_progress_update(request_id, "Reusing previously generated video")
+            success = True
+        else:
+            # Process video using InfiniteTalk
+            success = await video_processor.process_video(
+                image_path=queue_item["image_path"],
+                audio_path=queue_item["audio_path"],
+                output_path=output_path,
+                request_id=request_id,
+                prompt=queue_item.get("prompt"),
+                progress_callback=lambda msg: asyncio.create_task(send_progress_update(request_id, msg)),
+                on_gpu_start=on_gpu_start
+            )
+            if success:
+                try:
+                    await asyncio.to_thread(output_cache.store, cache_key, output_path)
+                except OSError as e:
+                    print(f"[{request_id}] Could not cache output: {e}")
+        
         if success:
-            # Mark as completed
-            queue_manager.complete_request(request_id, result_url=f"/api/result/{request_id}")
+            # Mark as completed, recording the file's stat so downloads
+            # don't need to touch the filesystem on the event loop
+            result_stat = await asyncio.to_thread(os.stat, output_path)
+            queue_manager.complete_request(
+                request_id,
+                result_url=f"/api/result/{request_id}",
+                result_path=output_path,
+                result_stat=result_stat
+            )
             
-            await manager.broadcast(json.dumps({
-                "type": "status_update",
-                "data": {
-                    "request_id": request_id,
-                    "status": "completed",
-                    "message": "Video generation completed!",
-                    "result_url": f"/api/result/{request_id}"
-                }
-            }))
+            await manager.broadcast(status_update_message(
+                request_id, "completed", "Video generation completed!",
+                result_url=f"/api/result/{request_id}"
+            ))
         else:
             # Mark as failed
             queue_manager.fail_request(request_id, "Video generation failed")
             
-            await manager.broadcast(json.dumps({
-                "type": "status_update",
-                "data": {
-                    "request_id": request_id,
-                    "status": "failed",
-                    "message": "Video generation failed"
-                }
-            }))
+            await manager.broadcast(status_update_message(request_id, "failed", "Video generation failed"))
     
     except Exception as e:
         # Mark as failed
         queue_manager.fail_request(request_id, f"Error: {str(e)}")
         
-        await manager.broadcast(json.dumps({
-            "type": "status_update",
-            "data": {
-                "request_id": request_id,
-                "status": "failed",
-                "message": f"Error: {str(e)}"
-            }
-        }))
+        await manager.broadcast(status_update_message(request_id, "failed", f"Error: {str(e)}"))
     
     finally:
         # Update queue status
-        await manager.broadcast(json.dumps({
-            "type": "queue_update",
-            "data": await get_queue_status_data()
-        }))
-        
-        # Try to process next item
-        await process_queue()
+        queue_dirty.set()
+
+def status_update_message(request_id: str, status: str, message: str, **extra) -> bytes:
+    """Serialize a status_update that also carries the current queue counters"""
+    return orjson.dumps({
+        "type": "status_update",
+        "data": {
+            "request_id": request_id,
+            "status": status,
+            "message": message,
+            **extra
+        },
+        "queue_size": queue_manager.get_queue_size(),
+        "preparing_count": queue_manager.get_preparing_count(),
+        "processing_count": queue_manager.get_processing_count()
+    })
 
 async def send_progress_update(request_id: str, message: str):
     """Send progress update via WebSocket"""
-    await manager.broadcast(json.dumps({
+    await manager.broadcast(orjson.dumps({
         "type": "progress_update",
         "data": {
             "request_id": request_id,
@@ -394,5 +676,9 @@ if __name__ == "__main__":
         host="0.0.0.0",
         port=8000,
         reload=False,
+        loop="uvloop",
+        http="httptools",
+        ws="websockets",
+        ws_per_message_deflate=True,
         log_level="info"
     )
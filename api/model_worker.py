@@ -0,0 +1,262 @@
+#!/usr/bin/env python3
+"""
+Resident InfiniteTalk model worker
+"""
+
+import os
+import copy
+import json
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Callable, Any, Dict, List
+
+READY_MARKER = b"WORKER_READY"
+RESULT_MARKER = b"WORKER_RESULT "
+
+# Stream reader buffer limit; longer lines are delivered in pieces
+STDOUT_LIMIT = 1 << 16
+
+class ModelWorker:
+    """
+    Long-running ``generate_infinitetalk.py --serve`` process.
+
+    The worker loads T5, VAE, CLIP and the DiT once and then runs one job per
+    JSON line written to its stdin, so requests no longer pay model loading.
+    Jobs are serialized: the worker owns the GPU and handles one at a time.
+    If the process dies it is restarted on the next job.
+    """
+
+    def __init__(self, cmd: List[str], cwd: str, env: Optional[Dict[str, str]] = None):
+        self.cmd = cmd
+        self.cwd = cwd
+        self.env = env
+        self._process: Optional[asyncio.subprocess.Process] = None
+        self._lock = asyncio.Lock()
+        self.restarts = 0
+
+    def is_alive(self) -> bool:
+        """Check if the worker process is running"""
+        return self._process is not None and self._process.returncode is None
+
+    def is_busy(self) -> bool:
+        """Check if the worker is starting up or running a job"""
+        return self._lock.locked()
+
+    async def ensure_started(self, line_callback: Optional[Callable[[str], Any]] = None):
+        """Start the worker if it isn't running and wait until its models are loaded"""
+        async with self._lock:
+            await self._ensure_started(line_callback)
+
+    async def _ensure_started(self, line_callback: Optional[Callable[[str], Any]] = None):
+        if self.is_alive():
+            return
+
+        if self._process is not None:
+            self.restarts += 1
+            print(f"[model_worker] Worker exited with code {self._process.returncode}, restarting")
+
+        self._process = await asyncio.create_subprocess_exec(
+            *self.cmd,
+            cwd=self.cwd,
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            env=self.env,
+            limit=STDOUT_LIMIT
+        )
+
+        # Forward model loading output until the worker reports ready
+        while True:
+            line = await self._read_line()
+            if not line:
+                await self._process.wait()
+                raise RuntimeError(f"Model worker exited with code {self._process.returncode} during startup")
+            line = line.strip()
+            if line == READY_MARKER:
+                return
+            if line_callback:
+                await line_callback(line.decode(errors="replace"))
+    
+    async def _read_line(self) -> bytes:
+        """Read one raw line from the worker, b"" at EOF"""
+        try:
+            return await self._process.stdout.readuntil(b"\n")
+        except asyncio.IncompleteReadError as e:
+            return e.partial
+        except asyncio.LimitOverrunError as e:
+            # Overlong line (e.g. tqdm redrawing with \r); hand it on in pieces
+            return await self._process.stdout.readexactly(e.consumed)
+
+    async def run(self, job: Dict[str, Any], line_callback: Optional[Callable[[str], Any]] = None,
+                  on_start: Optional[Callable[[], Any]] = None) -> Dict[str, Any]:
+        """
+        Run one generation job on the worker
+
+        Args:
+            job: Job description, at least input_data (or input_json) and save_file
+            line_callback: Coroutine called with every output line of the job
+            on_start: Coroutine called once the job has the worker to itself
+
+        Returns:
+            dict: {"ok": True, "save_file": ...} or {"ok": False, "error": ...}
+        """
+        async with self._lock:
+            if on_start:
+                await on_start()
+            try:
+                await self._ensure_started(line_callback)
+            except Exception as e:
+                return {"ok": False, "error": str(e)}
+
+            self._process.stdin.write(json.dumps(job).encode() + b"\n")
+            await self._process.stdin.drain()
+
+            while True:
+                line = await self._read_line()
+                if not line:
+                    await self._process.wait()
+                    return {"ok": False, "error": f"Model worker exited with code {self._process.returncode}"}
+                line = line.strip()
+                if line.startswith(RESULT_MARKER):
+                    return json.loads(line[len(RESULT_MARKER):])
+                if line_callback:
+                    await line_callback(line.decode(errors="replace"))
+
+    async def stop(self):
+        """Stop the worker process"""
+        if not self.is_alive():
+            return
+        # Closing stdin ends the worker's job loop
+        self._process.stdin.close()
+        try:
+            await asyncio.wait_for(self._process.wait(), timeout=30)
+        except asyncio.TimeoutError:
+            self._process.kill()
+            await self._process.wait()
+
+
+class _LineForwardingHandler(logging.Handler):
+    """Logging handler that hands formatted records to an asyncio queue"""
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, lines: asyncio.Queue):
+        super().__init__(level=logging.INFO)
+        self.setFormatter(logging.Formatter("[%(asctime)s] %(levelname)s: %(message)s"))
+        self._loop = loop
+        self._lines = lines
+
+    def emit(self, record: logging.LogRecord):
+        self._loop.call_soon_threadsafe(self._lines.put_nowait, self.format(record))
+
+
+class InProcessModelWorker:
+    """
+    Runs generate_infinitetalk inside the API process.
+
+    Same interface as ModelWorker, but the models are loaded and jobs run on
+    a single dedicated thread, avoiding the child process and the stdin/
+    stdout hop. Progress is taken from the generator's log records, so
+    bare print() output is not seen by line callbacks. Heavy imports (torch,
+    wan) happen on first start.
+    """
+
+    def __init__(self, args: List[str], env: Optional[Dict[str, str]] = None):
+        self.args = args
+        self.env = env or {}
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="infinitetalk-gpu")
+        self._lock = asyncio.Lock()
+        self._module = None
+        self._base_args = None
+        self._models = None
+
+    def is_alive(self) -> bool:
+        """Check if the models are loaded"""
+        return self._models is not None
+
+    def is_busy(self) -> bool:
+        """Check if the worker is starting up or running a job"""
+        return self._lock.locked()
+
+    async def ensure_started(self, line_callback: Optional[Callable[[str], Any]] = None):
+        """Load the models if they aren't loaded yet"""
+        async with self._lock:
+            await self._ensure_started(line_callback)
+
+    async def _ensure_started(self, line_callback: Optional[Callable[[str], Any]] = None):
+        if self.is_alive():
+            return
+        await self._call(self._load, line_callback=line_callback)
+
+    def _load(self):
+        # Must be in place before torch initializes CUDA; settings the
+        # operator already exported win
+        for key, value in self.env.items():
+            os.environ.setdefault(key, value)
+        
+        import generate_infinitetalk
+
+        # generate_infinitetalk configures logging with basicConfig, which is
+        # a no-op once handlers exist; make sure INFO records get through
+        logging.getLogger().setLevel(logging.INFO)
+        self._module = generate_infinitetalk
+        self._base_args = generate_infinitetalk._parse_args(self.args)
+        self._models = generate_infinitetalk.load_models(self._base_args)
+
+    def _generate(self, job: Dict[str, Any]) -> str:
+        job = dict(job)
+        input_data = job.pop("input_data", None)
+        job_args = copy.copy(self._base_args)
+        for key, value in job.items():
+            setattr(job_args, key, value)
+        if input_data is None:
+            with open(job_args.input_json, 'r', encoding='utf-8') as f:
+                input_data = json.load(f)
+        return self._module.generate_from_input(job_args, self._models, input_data)
+
+    async def _call(self, fn: Callable, *args, line_callback: Optional[Callable[[str], Any]] = None):
+        """Run fn on the GPU thread, forwarding log lines to line_callback"""
+        loop = asyncio.get_running_loop()
+        lines: asyncio.Queue = asyncio.Queue()
+        handler = _LineForwardingHandler(loop, lines)
+        logging.getLogger().addHandler(handler)
+        try:
+            future = loop.run_in_executor(self._executor, fn, *args)
+            # Queued after any log lines the job emitted before finishing
+            future.add_done_callback(lambda _: lines.put_nowait(None))
+            while (line := await lines.get()) is not None:
+                if line_callback:
+                    await line_callback(line)
+            return future.result()
+        finally:
+            logging.getLogger().removeHandler(handler)
+
+    async def run(self, job: Dict[str, Any], line_callback: Optional[Callable[[str], Any]] = None,
+                  on_start: Optional[Callable[[], Any]] = None) -> Dict[str, Any]:
+        """
+        Run one generation job
+
+        Args:
+            job: Job description, at least input_data (or input_json) and save_file
+            line_callback: Coroutine called with every log line of the job
+            on_start: Coroutine called once the job has the worker to itself
+
+        Returns:
+            dict: {"ok": True, "save_file": ...} or {"ok": False, "error": ...}
+        """
+        async with self._lock:
+            if on_start:
+                await on_start()
+            try:
+                await self._ensure_started(line_callback)
+                save_file = await self._call(self._generate, job, line_callback=line_callback)
+                result = {"ok": True, "save_file": save_file}
+            except Exception as e:
+                result = {"ok": False, "error": f"{type(e).__name__}: {e}"}
+            if self._module is not None:
+                result["cuda_memory"] = self._module.cuda_memory_stats()
+            return result
+
+    async def stop(self):
+        """Release the models and the GPU thread"""
+        async with self._lock:
+            self._models = None
+            self._executor.shutdown(wait=False)
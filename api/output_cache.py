@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+Disk cache of generated videos for InfiniteTalk
+"""
+
+import os
+import shutil
+import hashlib
+import threading
+from typing import Optional
+from collections import OrderedDict
+
+class OutputCache:
+    """LRU cache of rendered videos, stored as hard links keyed by their inputs"""
+
+    def __init__(self, cache_dir: str, max_bytes: int):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+
+        # key -> size in bytes, least recently used first
+        self._entries: OrderedDict = OrderedDict()
+        self._total_bytes = 0
+
+        os.makedirs(cache_dir, exist_ok=True)
+        entries = []
+        for entry in os.scandir(cache_dir):
+            if entry.is_file() and entry.name.endswith(".tmp"):
+                # Left behind by a crash while storing
+                os.remove(entry.path)
+            elif entry.is_file() and entry.name.endswith(".mp4"):
+                stat = entry.stat()
+                entries.append((stat.st_mtime_ns, entry.name[:-4], stat.st_size))
+        for _, key, size in sorted(entries):
+            self._entries[key] = size
+            self._total_bytes += size
+
+    @staticmethod
+    def make_key(prompt: Optional[str], image_hash: str, audio_hash: str, settings: str = "") -> str:
+        """Build the cache key for a request's inputs and generation settings"""
+        h = hashlib.blake2b(digest_size=32)
+        for part in (prompt or "", image_hash, audio_hash, settings):
+            data = part.encode()
+            # Length-prefix each part so different splits can't collide
+            h.update(len(data).to_bytes(8, "little"))
+            h.update(data)
+        return h.hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.mp4")
+
+    def lookup(self, key: str, output_path: str) -> bool:
+        """Place a cached video at output_path, False on a miss"""
+        with self._lock:
+            if key not in self._entries:
+                return False
+            path = self._path(key)
+            try:
+                _link_or_copy(path, output_path)
+                os.utime(path)
+            except FileNotFoundError:
+                # Removed behind our back
+                self._total_bytes -= self._entries.pop(key)
+                return False
+            self._entries.move_to_end(key)
+            return True
+
+    def store(self, key: str, output_path: str):
+        """Add a finished video to the cache and evict beyond max_bytes"""
+        with self._lock:
+            if key in self._entries:
+                return
+            path = self._path(key)
+            _link_or_copy(output_path, path)
+            size = os.stat(path).st_size
+            self._entries[key] = size
+            self._total_bytes += size
+
+            while self._total_bytes > self.max_bytes and len(self._entries) > 1:
+                old_key, old_size = self._entries.popitem(last=False)
+                self._total_bytes -= old_size
+                try:
+                    os.remove(self._path(old_key))
+                except FileNotFoundError:
+                    pass
+
+def _link_or_copy(src: str, dst: str):
+    """Hard link src to dst, copying across filesystems; replaces dst"""
+    tmp = f"{dst}.tmp"
+    try:
+        os.link(src, tmp)
+    except FileExistsError:
+        os.remove(tmp)
+        os.link(src, tmp)
+    except OSError:
+        shutil.copyfile(src, tmp)
+    os.replace(tmp, dst)
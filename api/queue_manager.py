@@ -3,175 +3,243 @@
 Queue management system for InfiniteTalk video generation
 """
 
+import os
 import time
 from typing import Dict, List, Optional, Any
 from datetime import datetime, timedelta
-from collections import deque
-import threading
+from collections import deque, OrderedDict
 
 class QueueManager:
-    def __init__(self, max_queue_size: int = 20, max_concurrent: int = 3):
+    """
+    In-memory request queue shared by the API's coroutines.
+
+    Not thread-safe: every method must be called from the event loop thread.
+    None of the methods await, so each one runs to completion without
+    interleaving with other coroutines, which makes the compound updates in
+    start_processing/complete_request/fail_request atomic without a lock.
+    """
+
+    def __init__(self, max_queue_size: int = 20, max_concurrent: int = 3, max_completed: int = 1000):
         self.max_queue_size = max_queue_size
         self.max_concurrent = max_concurrent
-        
-        # Thread-safe collections
-        self._lock = threading.Lock()
+        self.max_completed = max_completed
         
         # Queue for pending requests
         self._queue: deque = deque()
         
+        # Monotonic sequence numbers so queue position is O(1): every queued
+        # item carries its "_seq", and _head_seq is the seq of the queue head
+        self._seq = 0
+        self._head_seq = 0
+        
+        # Bumped on every mutation so callers can cache derived payloads
+        self._version = 0
+        
+        # Requests taken off the queue that are preparing their inputs or
+        # waiting for the GPU, in the order they were taken
+        self._preparing: OrderedDict = OrderedDict()
+        
         # Currently processing requests
         self._processing: Dict[str, Dict[str, Any]] = {}
         
-        # Completed/failed requests (keep for a while for status checking)
-        self._completed: Dict[str, Dict[str, Any]] = {}
+        # Completed/failed requests (keep for a while for status checking),
+        # oldest first and capped at max_completed
+        self._completed: OrderedDict = OrderedDict()
         
         # Request lookup by ID
         self._all_requests: Dict[str, Dict[str, Any]] = {}
     
     def add_to_queue(self, request_item: Dict[str, Any]) -> bool:
         """Add a request to the queue"""
-        with self._lock:
-            if len(self._queue) >= self.max_queue_size:
-                return False
-            
-            request_item["queued_at"] = time.time()
-            request_item["status"] = "queued"
-            
-            self._queue.append(request_item)
-            self._all_requests[request_item["request_id"]] = request_item
-            
-            return True
+        if len(self._queue) >= self.max_queue_size:
+            return False
+        
+        request_item["queued_at"] = time.time()
+        request_item["status"] = "queued"
+        request_item["_seq"] = self._seq
+        self._seq += 1
+        
+        self._queue.append(request_item)
+        self._all_requests[request_item["request_id"]] = request_item
+        self._version += 1
+        
+        return True
     
     def get_next_item(self) -> Optional[Dict[str, Any]]:
         """Get the next item from the queue"""
-        with self._lock:
-            if self._queue:
-                return self._queue.popleft()
-            return None
+        if self._queue:
+            request_item = self._queue.popleft()
+            self._head_seq = request_item["_seq"] + 1
+            self._version += 1
+            return request_item
+        return None
     
-    def start_processing(self, request_id: str) -> bool:
-        """Move a request from queue to processing"""
-        with self._lock:
-            if len(self._processing) >= self.max_concurrent:
-                return False
-            
-            if request_id in self._all_requests:
-                request_item = self._all_requests[request_id]
-                request_item["status"] = "processing"
-                request_item["started_at"] = time.time()
-                
-                self._processing[request_id] = request_item
-                return True
+    def start_preparing(self, request_id: str) -> bool:
+        """Mark a request taken off the queue as preparing/waiting for the GPU"""
+        if request_id in self._all_requests:
+            request_item = self._all_requests[request_id]
+            request_item["status"] = "preparing"
             
+            self._preparing[request_id] = request_item
+            self._version += 1
+            return True
+        
+        return False
+    
+    def start_processing(self, request_id: str) -> bool:
+        """Move a request from queue or preparing to processing"""
+        if len(self._processing) >= self.max_concurrent:
             return False
+        
+        if request_id in self._all_requests:
+            request_item = self._all_requests[request_id]
+            request_item["status"] = "processing"
+            request_item["started_at"] = time.time()
+            
+            self._preparing.pop(request_id, None)
+            self._processing[request_id] = request_item
+            self._version += 1
+            return True
+        
+        return False
+    
+    def _pop_active(self, request_id: str) -> Optional[Dict[str, Any]]:
+        """Remove a request from processing or preparing"""
+        if request_id in self._processing:
+            return self._processing.pop(request_id)
+        return self._preparing.pop(request_id, None)
     
-    def complete_request(self, request_id: str, result_url: str = None):
+    def complete_request(self, request_id: str, result_url: str = None,
+                         result_path: str = None, result_stat: os.stat_result = None):
         """Mark a request as completed"""
-        with self._lock:
-            if request_id in self._processing:
-                request_item = self._processing.pop(request_id)
-                request_item["status"] = "completed"
-                request_item["completed_at"] = time.time()
-                request_item["result_url"] = result_url
-                
-                self._completed[request_id] = request_item
-                self._all_requests[request_id] = request_item
+        request_item = self._pop_active(request_id)
+        if request_item is not None:
+            request_item["status"] = "completed"
+            request_item["completed_at"] = time.time()
+            request_item["result_url"] = result_url
+            request_item["result_path"] = result_path
+            request_item["result_stat"] = result_stat
+            
+            self._completed[request_id] = request_item
+            self._all_requests[request_id] = request_item
+            self._evict_completed()
+            self._version += 1
     
     def fail_request(self, request_id: str, error_message: str):
         """Mark a request as failed"""
-        with self._lock:
-            if request_id in self._processing:
-                request_item = self._processing.pop(request_id)
-                request_item["status"] = "failed"
-                request_item["error"] = error_message
-                request_item["failed_at"] = time.time()
-                
-                self._completed[request_id] = request_item
-                self._all_requests[request_id] = request_item
+        request_item = self._pop_active(request_id)
+        if request_item is not None:
+            request_item["status"] = "failed"
+            request_item["error"] = error_message
+            request_item["failed_at"] = time.time()
+            
+            self._completed[request_id] = request_item
+            self._all_requests[request_id] = request_item
+            self._evict_completed()
+            self._version += 1
+    
+    def _evict_completed(self):
+        """Drop the oldest completed/failed requests beyond max_completed"""
+        while len(self._completed) > self.max_completed:
+            request_id, _ = self._completed.popitem(last=False)
+            self._all_requests.pop(request_id, None)
     
     def update_request_status(self, request_id: str, status: str, message: str = ""):
         """Update the status of a request"""
-        with self._lock:
-            if request_id in self._all_requests:
-                self._all_requests[request_id]["status"] = status
-                self._all_requests[request_id]["message"] = message
-                self._all_requests[request_id]["last_updated"] = time.time()
-                
-                # Update in processing dict if it exists there
-                if request_id in self._processing:
-                    self._processing[request_id]["status"] = status
-                    self._processing[request_id]["message"] = message
-                    self._processing[request_id]["last_updated"] = time.time()
+        if request_id in self._all_requests:
+            self._all_requests[request_id]["status"] = status
+            self._all_requests[request_id]["message"] = message
+            self._all_requests[request_id]["last_updated"] = time.time()
+            
+            # Update in processing dict if it exists there
+            if request_id in self._processing:
+                self._processing[request_id]["status"] = status
+                self._processing[request_id]["message"] = message
+                self._processing[request_id]["last_updated"] = time.time()
+            
+            self._version += 1
+    
+    def get_version(self) -> int:
+        """Get a counter that changes whenever any request state changes"""
+        return self._version
     
     def get_request_status(self, request_id: str) -> Optional[Dict[str, Any]]:
         """Get the status of a specific request"""
-        with self._lock:
-            return self._all_requests.get(request_id)
+        return self._all_requests.get(request_id)
     
     def get_queue_size(self) -> int:
         """Get current queue size"""
-        with self._lock:
-            return len(self._queue)
+        return len(self._queue)
     
     def get_processing_count(self) -> int:
         """Get current processing count"""
-        with self._lock:
-            return len(self._processing)
+        return len(self._processing)
+    
+    def get_preparing_count(self) -> int:
+        """Get the number of requests preparing or waiting for the GPU"""
+        return len(self._preparing)
     
     def can_start_processing(self) -> bool:
         """Check if we can start processing a new request"""
-        with self._lock:
-            return len(self._processing) < self.max_concurrent and len(self._queue) > 0
+        return len(self._processing) < self.max_concurrent and len(self._queue) > 0
     
     def get_queue_position(self, request_id: str) -> Optional[int]:
         """Get position in queue (1-based)"""
-        with self._lock:
-            for i, item in enumerate(self._queue):
-                if item["request_id"] == request_id:
-                    return i + 1
+        request_item = self._all_requests.get(request_id)
+        if request_item is None or request_item.get("_seq", -1) < self._head_seq:
             return None
+        return request_item["_seq"] - self._head_seq + 1
     
     def get_all_requests(self) -> List[Dict[str, Any]]:
         """Get all queued requests"""
-        with self._lock:
-            return list(self._queue)
+        return list(self._queue)
+    
+    def get_preparing_requests(self) -> List[Dict[str, Any]]:
+        """Get all requests preparing or waiting for the GPU"""
+        return list(self._preparing.values())
     
     def get_processing_requests(self) -> List[Dict[str, Any]]:
         """Get all currently processing requests"""
-        with self._lock:
-            return list(self._processing.values())
+        return list(self._processing.values())
     
     def get_completed_requests(self) -> List[Dict[str, Any]]:
         """Get all completed requests"""
-        with self._lock:
-            return list(self._completed.values())
+        return list(self._completed.values())
     
     def cleanup_old_requests(self, max_age_hours: int = 24):
         """Remove old completed/failed requests"""
         current_time = time.time()
         cutoff_time = current_time - (max_age_hours * 3600)
         
-        with self._lock:
-            to_remove = []
-            for request_id, request_item in self._completed.items():
-                completed_at = request_item.get("completed_at") or request_item.get("failed_at", 0)
-                if completed_at < cutoff_time:
-                    to_remove.append(request_id)
-            
-            for request_id in to_remove:
-                self._completed.pop(request_id, None)
-                self._all_requests.pop(request_id, None)
+        to_remove = []
+        for request_id, request_item in self._completed.items():
+            completed_at = request_item.get("completed_at") or request_item.get("failed_at", 0)
+            if completed_at < cutoff_time:
+                to_remove.append(request_id)
+        
+        for request_id in to_remove:
+            self._completed.pop(request_id, None)
+            self._all_requests.pop(request_id, None)
+        
+        if to_remove:
+            self._version += 1
     
     def get_estimated_wait_time(self, request_id: str) -> Optional[str]:
         """Get estimated wait time for a request"""
-        position = self.get_queue_position(request_id)
-        if position is None:
-            return None
+        # Requests are generated one at a time, so the job holding the GPU
+        # and everything already taken off the queue and waiting for it are
+        # ahead of queued requests
+        if request_id in self._preparing:
+            ahead = len(self._processing) + list(self._preparing).index(request_id) + 1
+        else:
+            position = self.get_queue_position(request_id)
+            if position is None:
+                return None
+            ahead = len(self._processing) + len(self._preparing) + position
         
         # Rough estimate: 2-5 minutes per video
         avg_processing_time = 3.5 * 60  # 3.5 minutes in seconds
-        estimated_seconds = position * avg_processing_time
+        estimated_seconds = ahead * avg_processing_time
         
         if estimated_seconds < 60:
             return f"{int(estimated_seconds)} seconds"
@@ -184,42 +252,56 @@ class QueueManager:
     
     def get_queue_stats(self) -> Dict[str, Any]:
         """Get detailed queue statistics"""
-        with self._lock:
-            total_requests = len(self._all_requests)
-            queued_count = len(self._queue)
-            processing_count = len(self._processing)
-            completed_count = len([r for r in self._completed.values() if r["status"] == "completed"])
-            failed_count = len([r for r in self._completed.values() if r["status"] == "failed"])
-            
-            return {
-                "total_requests": total_requests,
-                "queued": queued_count,
-                "processing": processing_count,
-                "completed": completed_count,
-                "failed": failed_count,
-                "queue_utilization": queued_count / self.max_queue_size,
-                "processing_utilization": processing_count / self.max_concurrent
-            }
+        total_requests = len(self._all_requests)
+        queued_count = len(self._queue)
+        preparing_count = len(self._preparing)
+        processing_count = len(self._processing)
+        completed_count = len([r for r in self._completed.values() if r["status"] == "completed"])
+        failed_count = len([r for r in self._completed.values() if r["status"] == "failed"])
+        
+        return {
+            "total_requests": total_requests,
+            "queued": queued_count,
+            "preparing": preparing_count,
+            "processing": processing_count,
+            "completed": completed_count,
+            "failed": failed_count,
+            "queue_utilization": queued_count / self.max_queue_size,
+            "processing_utilization": processing_count / self.max_concurrent
+        }
     
     def remove_request(self, request_id: str) -> bool:
         """Remove a request from all tracking structures"""
-        with self._lock:
-            removed = False
-            
-            # Remove from queue if present
-            self._queue = [req for req in self._queue if req["request_id"] != request_id]
-            
-            # Remove from processing if present
-            if request_id in self._processing:
-                del self._processing[request_id]
-                removed = True
-            
-            # Remove from completed if present
-            if request_id in self._completed:
-                del self._completed[request_id]
-                removed = True
-            
-            # Remove from all requests if present
-            self._all_requests = [req for req in self._all_requests if req["request_id"] != request_id]
-            
-            return removed
+        removed = False
+        
+        # Remove from queue if present
+        if self.get_queue_position(request_id) is not None:
+            self._queue = deque(req for req in self._queue if req["request_id"] != request_id)
+            # Renumber so positions of the items behind it stay contiguous
+            for seq, req in enumerate(self._queue, start=self._head_seq):
+                req["_seq"] = seq
+            self._seq = self._head_seq + len(self._queue)
+            removed = True
+        
+        # Remove from preparing if present
+        if self._preparing.pop(request_id, None) is not None:
+            removed = True
+        
+        # Remove from processing if present
+        if request_id in self._processing:
+            del self._processing[request_id]
+            removed = True
+        
+        # Remove from completed if present
+        if request_id in self._completed:
+            del self._completed[request_id]
+            removed = True
+        
+        # Remove from all requests if present
+        if self._all_requests.pop(request_id, None) is not None:
+            removed = True
+        
+        if removed:
+            self._version += 1
+        
+        return removed
@@ -18,11 +18,26 @@ if __name__ == "__main__":
     os.makedirs("uploads", exist_ok=True)
     os.makedirs("outputs", exist_ok=True)
     
+    # Number of server processes (standard WEB_CONCURRENCY knob)
+    workers = int(os.getenv("WEB_CONCURRENCY", "1"))
+    if workers > 1:
+        # QueueManager, the WebSocket connection list and the GPU job
+        # dispatch all live in process memory, so extra workers would each
+        # see a different queue and launch their own generation jobs
+        sys.exit(
+            f"WEB_CONCURRENCY={workers} is not supported: queue state is "
+            "per-process. Run a single worker."
+        )
+    
     # Run the server in production mode (no reload)
     uvicorn.run(
         app,
         host="0.0.0.0",
         port=8000,
         reload=False,
+        loop="uvloop",
+        http="httptools",
+        ws="websockets",
+        ws_per_message_deflate=True,
         log_level="info"
     )
@@ -4,21 +4,384 @@ Video processor for InfiniteTalk integration
 """
 
 import os
+import re
 import sys
-import json
+import time
+import zlib
+import wave
+import struct
+import glob
+import mmap
 import asyncio
-import subprocess
-from typing import Optional, Callable, Any
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Callable, Any, Dict, List
 from pathlib import Path
 
 # Add parent directory to path to import InfiniteTalk modules
 sys.path.append(str(Path(__file__).parent.parent))
 
+from model_worker import ModelWorker, InProcessModelWorker
+from weight_cache import WeightCache
+
+# Model files that must exist before generation can run
+REQUIRED_WEIGHTS = [
+    "weights/Wan2.1-I2V-14B-480P/models_t5_umt5-xxl-enc-bf16.pth",
+    "weights/Wan2.1-I2V-14B-480P/Wan2.1_VAE.pth", 
+    "weights/Wan2.1-I2V-14B-480P/models_clip_open-clip-xlm-roberta-large-vit-huge-14.pth",
+    "weights/chinese-wav2vec2-base",
+    "weights/InfiniteTalk/single/infinitetalk.safetensors",
+    "weights/lightx2v_lora.safetensors"
+]
+
+# Prompt used when a request doesn't provide one
+DEFAULT_PROMPT = "A person speaking naturally with clear lip sync and facial expressions, professional video quality with natural lighting and smooth motion"
+
+# How long an is_model_ready() result is reused, in seconds
+MODEL_READY_TTL = 5.0
+
+# Everything the worker reads at startup, for page cache prefetching
+PREFETCH_WEIGHTS = REQUIRED_WEIGHTS + [
+    "weights/Wan2.1-I2V-14B-480P/diffusion_pytorch_model-*.safetensors"
+]
+
+# Everything the worker loads, mirrored by the weight cache. The checkpoint
+# directory goes whole: besides the weights listed above, the pipeline reads
+# its config.json and the T5/CLIP tokenizer directories from it.
+WEIGHT_CACHE_PATHS = [
+    "weights/Wan2.1-I2V-14B-480P",
+    "weights/chinese-wav2vec2-base",
+    "weights/InfiniteTalk/single/infinitetalk.safetensors",
+    "weights/lightx2v_lora.safetensors"
+]
+
+# Worker output substrings mapped to user-facing progress messages
+PROGRESS_MESSAGES = {
+    # Weight files by basename: the loaders log absolute paths, whose prefix
+    # depends on the install and weight cache location
+    "models_t5_umt5-xxl-enc-bf16.pth": "Loading T5 text encoder...",
+    "Wan2.1_VAE.pth": "Loading VAE decoder...",
+    "models_clip_": "Loading CLIP vision encoder...",
+    "Creating WanModel": "Loading 14B DiT transformer...",
+    "Loading LoRA weights": "Applying lightx2v LoRA...",
+    "Applied LoRA": "lightx2v LoRA applied successfully",
+    "Generating video": "Starting video generation...",
+    "No conversion needed": "Processing audio embedding...",
+    "Video generation completed": "Video generation completed!"
+}
+
+# All triggers as one alternation so each line is scanned once by the
+# regex engine instead of once per trigger in Python
+PROGRESS_PATTERN = re.compile("|".join(map(re.escape, PROGRESS_MESSAGES)))
+
+def _warm_inputs(paths: List[str]):
+    """Read request inputs so they are in the page cache when the worker opens them"""
+    for path in paths:
+        with open(path, "rb") as f:
+            while f.read(1 << 20):
+                pass
+
+def _write_warmup_inputs(warmup_dir: str):
+    """Write a small gray PNG and a few seconds of silent 16 kHz WAV"""
+    os.makedirs(warmup_dir, exist_ok=True)
+    image_path = os.path.join(warmup_dir, "warmup.png")
+    audio_path = os.path.join(warmup_dir, "warmup.wav")
+    
+    if not os.path.exists(image_path):
+        width = height = 64
+        def chunk(tag: bytes, data: bytes) -> bytes:
+            return struct.pack(">I", len(data)) + tag + data + struct.pack(">I", zlib.crc32(tag + data))
+        rows = b"".join(b"\x00" + b"\x80" * (width * 3) for _ in range(height))
+        png = (b"\x89PNG\r\n\x1a\n"
+               + chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0))
+               + chunk(b"IDAT", zlib.compress(rows))
+               + chunk(b"IEND", b""))
+        with open(image_path, "wb") as f:
+            f.write(png)
+    
+    if not os.path.exists(audio_path):
+        with wave.open(audio_path, "wb") as w:
+            w.setnchannels(1)
+            w.setsampwidth(2)
+            w.setframerate(16000)
+            # Long enough to cover one 81-frame clip at 25 fps
+            w.writeframes(b"\x00\x00" * 16000 * 4)
+    
+    return image_path, audio_path
+
+def _prefetch_file(path: str) -> Optional[mmap.mmap]:
+    """Pull a file into the page cache and return its mapping"""
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        size = os.fstat(fd).st_size
+        if size == 0:
+            return None
+        if hasattr(os, "posix_fadvise"):
+            os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_SEQUENTIAL)
+            os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_WILLNEED)
+        # MAP_POPULATE (Linux) faults in every page before mmap returns
+        populate = getattr(mmap, "MAP_POPULATE", 0)
+        mapping = mmap.mmap(fd, size, flags=mmap.MAP_SHARED | populate, prot=mmap.PROT_READ)
+        if not populate and hasattr(mapping, "madvise"):
+            mapping.madvise(mmap.MADV_WILLNEED)
+        return mapping
+    finally:
+        os.close(fd)
+
+def _mem_available() -> Optional[int]:
+    """MemAvailable from /proc/meminfo in bytes, None where it isn't available"""
+    try:
+        with open("/proc/meminfo", "r") as f:
+            for line in f:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError):
+        pass
+    return None
+
 class VideoProcessor:
-    def __init__(self):
+    def __init__(self, in_process: bool = False, dit_quant: Optional[str] = None,
+                 quant_dir: Optional[str] = None, streaming_budget_gb: Optional[float] = 12.0,
+                 weights_cache_dir: Optional[str] = None, weights_cache_gb: float = 200,
+                 cuda_alloc_conf: str = "expandable_segments:True"):
         self.infinitetalk_dir = Path(__file__).parent.parent
         self.python_env = "/root/miniconda3/envs/multitalk/bin/python"
         self.model_initialized = False
+        
+        # Mappings of prefetched weight files, kept open so their pages stay
+        # mapped while the worker loads them
+        self._prefetched: Dict[str, mmap.mmap] = {}
+        
+        # Required weight names grouped by directory, so readiness checks
+        # list each directory once instead of stat'ing every file
+        self._required_by_dir: Dict[Path, set] = {}
+        for file_path in REQUIRED_WEIGHTS:
+            full_path = self.infinitetalk_dir / file_path
+            self._required_by_dir.setdefault(full_path.parent, set()).add(full_path.name)
+        self._model_ready: Optional[bool] = None
+        self._model_ready_checked = 0.0
+        
+        # Generated warm-up image/audio, written once
+        self._warmup_inputs: Optional[tuple] = None
+        
+        # Optional local copy of weights/ for when it sits on slow or
+        # remote storage; the worker then loads from the copy
+        self.weight_cache = None
+        self.weights_root = self.infinitetalk_dir
+        if weights_cache_dir:
+            self.weight_cache = WeightCache(
+                str(self.infinitetalk_dir),
+                str(Path(weights_cache_dir).resolve()),
+                max_bytes=int(weights_cache_gb * (1 << 30))
+            )
+            self.weights_root = Path(self.weight_cache.cache_dir)
+        
+        # Set once the worker's weights are in place; jobs wait on it so the
+        # worker never starts against a half-filled cache
+        self._weights_ready = asyncio.Event()
+        self._weights_error: Optional[str] = None
+        if self.weight_cache is None:
+            self._weights_ready.set()
+        
+        # Generator arguments shared by every job. Paths are absolute so the
+        # worker doesn't depend on its working directory.
+        weights_dir = self.weights_root / "weights"
+        self.worker_args = [
+            "--ckpt_dir", str(weights_dir / "Wan2.1-I2V-14B-480P"),
+            "--wav2vec_dir", str(weights_dir / "chinese-wav2vec2-base"),
+            "--infinitetalk_dir", str(weights_dir / "InfiniteTalk/single/infinitetalk.safetensors"),
+            "--lora_dir", str(weights_dir / "lightx2v_lora.safetensors"),
+            "--audio_save_dir", str(self.infinitetalk_dir / "save_audio"),
+            "--lora_scale", "1.0",
+            "--size", "infinitetalk-480",
+            "--sample_text_guide_scale", "1.0",
+            "--sample_audio_guide_scale", "2.0",
+            "--sample_steps", "6",  # lightx2v 4-step acceleration
+            "--mode", "streaming",
+            "--motion_frame", "9",
+            "--sample_shift", "2"
+        ]
+        
+        # DiT residency: the worker keeps as many DiT parameters in VRAM as
+        # fit after the T5/CLIP encoders and streaming_budget_gb for
+        # activations, instead of streaming every layer from host memory on
+        # every step. None streams the whole DiT (lowest VRAM use).
+        self.streaming_budget_gb = streaming_budget_gb
+        if streaming_budget_gb is None:
+            self.worker_args += ["--num_persistent_param_in_dit", "0"]
+        else:
+            self.worker_args += ["--vram_reserve_gb", str(streaming_budget_gb)]
+        
+        # Weights loaded by this configuration, for the cache and prefetch
+        self.weight_cache_paths = list(WEIGHT_CACHE_PATHS)
+        self.prefetch_paths = list(PREFETCH_WEIGHTS)
+        
+        # DiT and T5 precision: bf16 by default, or a pre-quantized int8/fp8
+        # checkpoint which halves the weights streamed per diffusion step.
+        # quant_dir is the DiT .safetensors file; the generator reads its
+        # quantization map from the sibling .json and the quantized T5 from
+        # t5_<quant>.safetensors/t5_map_<quant>.json in the same directory.
+        # The generator skips the LoRA for quantized models, so the quantized
+        # checkpoint must already have lightx2v merged in.
+        if dit_quant not in (None, "int8", "fp8"):
+            raise ValueError("dit_quant must be 'int8', 'fp8' or None")
+        if dit_quant and not quant_dir:
+            raise ValueError("quant_dir is required when dit_quant is set")
+        self.dit_quant = dit_quant
+        if dit_quant:
+            quant_path = Path(quant_dir).resolve()
+            if quant_path.suffix != ".safetensors":
+                raise ValueError("quant_dir must be the quantized DiT .safetensors file")
+            quant_files = [
+                quant_path,
+                Path(str(quant_path).replace("safetensors", "json")),
+                quant_path.parent / f"t5_{dit_quant}.safetensors",
+                quant_path.parent / f"t5_map_{dit_quant}.json"
+            ]
+            missing = [str(path) for path in quant_files if not path.is_file()]
+            if missing:
+                raise ValueError(f"Quantized checkpoint files not found: {', '.join(missing)}")
+            
+            # The quantized files replace the bf16 DiT shards and T5. Files
+            # inside the repo are mirrored by the weight cache; the cache
+            # can't mirror files outside it, those load in place.
+            self.prefetch_paths = [
+                p for p in self.prefetch_paths
+                if "diffusion_pytorch_model" not in p and "models_t5_" not in p
+            ]
+            try:
+                rel_files = [str(path.relative_to(self.infinitetalk_dir.resolve())) for path in quant_files]
+                self.weight_cache_paths += rel_files
+                self.prefetch_paths += rel_files
+                quant_path = self.weights_root / rel_files[0]
+            except ValueError:
+                self.prefetch_paths += [str(path) for path in quant_files]
+            self.worker_args += ["--quant", dit_quant, "--quant_dir", str(quant_path)]
+        
+        # CUDA caching allocator settings for the worker. The resident
+        # worker keeps its allocator pool across requests, and expandable
+        # segments stop requests with different frame counts and resolutions
+        # from fragmenting it. PYTORCH_CUDA_ALLOC_CONF from the environment
+        # takes precedence.
+        self.cuda_alloc_conf = os.environ.get("PYTORCH_CUDA_ALLOC_CONF", cuda_alloc_conf)
+        worker_env = {"PYTORCH_CUDA_ALLOC_CONF": self.cuda_alloc_conf}
+        
+        # Allocator counters reported by the worker after its last job
+        self.cuda_memory: Optional[Dict[str, int]] = None
+        
+        # The argv is fixed for the worker's lifetime; jobs only send their
+        # inputs and output path
+        self._base_cmd = [self.python_env, "generate_infinitetalk.py", "--serve", *self.worker_args]
+        
+        # Resident worker that keeps the models loaded between requests,
+        # either in a child process (default) or on a thread of this process
+        if in_process:
+            self.worker = InProcessModelWorker(self.worker_args, env=worker_env)
+        else:
+            self.worker = ModelWorker(
+                cmd=self._base_cmd,
+                cwd=str(self.infinitetalk_dir),
+                env=dict(os.environ, PYTHONPATH=str(self.infinitetalk_dir), **worker_env)
+            )
+    
+    async def ensure_weights(self):
+        """Bring the local weight cache up to date, if one is configured"""
+        if self.weight_cache is None:
+            return
+        try:
+            await asyncio.to_thread(self.weight_cache.sync, self.weight_cache_paths)
+        except Exception as e:
+            self._weights_error = f"Weight cache sync failed: {e}"
+            raise
+        finally:
+            self._weights_ready.set()
+    
+    async def prefetch_weights(self, max_workers: int = 8):
+        """Read all model weights into the OS page cache in parallel"""
+        paths = []
+        for pattern in self.prefetch_paths:
+            for match in glob.glob(str(self.weights_root / pattern)):
+                if os.path.isdir(match):
+                    for root, _, files in os.walk(match):
+                        paths.extend(os.path.join(root, name) for name in files)
+                else:
+                    paths.append(match)
+        
+        # Populating more than fits in memory evicts the earlier files'
+        # pages before the worker reads them, adding I/O instead of saving it
+        total_bytes = sum(os.path.getsize(path) for path in paths)
+        available = _mem_available()
+        if available is not None and total_bytes > available:
+            print(f"[prefetch] Skipped: weights ({total_bytes / (1 << 30):.1f} GB) exceed "
+                  f"available memory ({available / (1 << 30):.1f} GB)")
+            return
+        
+        loop = asyncio.get_running_loop()
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            results = await asyncio.gather(
+                *(loop.run_in_executor(executor, _prefetch_file, path) for path in paths),
+                return_exceptions=True
+            )
+        
+        for path, result in zip(paths, results):
+            if isinstance(result, Exception):
+                print(f"[prefetch] Failed to prefetch {path}: {result}")
+            elif result is not None:
+                self._prefetched[path] = result
+    
+    async def start(self):
+        """Start the model worker and load the models"""
+        await self.worker.ensure_started(self._log_startup_line)
+        self.model_initialized = True
+    
+    async def warmup(self) -> bool:
+        """
+        Run one throwaway single-step clip so CUDA context setup, cuBLAS/
+        cuDNN algorithm selection and allocator growth happen before the
+        first real request
+        
+        Returns:
+            bool: True if the warm-up generation succeeded
+        """
+        warmup_dir = str(self.infinitetalk_dir / "api" / "warmup")
+        if self._warmup_inputs is None:
+            self._warmup_inputs = await asyncio.to_thread(_write_warmup_inputs, warmup_dir)
+        image_path, audio_path = self._warmup_inputs
+        
+        result = await self.worker.run(
+            {
+                "input_data": {
+                    "prompt": "warm-up",
+                    "cond_video": image_path,
+                    "cond_audio": {"person1": audio_path}
+                },
+                "save_file": os.path.join(warmup_dir, "warmup_output"),
+                "mode": "clip",
+                "sample_steps": 1
+            },
+            line_callback=self._log_startup_line
+        )
+        self.cuda_memory = result.get("cuda_memory") or self.cuda_memory
+        if not result["ok"]:
+            print(f"[model_worker] Warm-up failed: {result.get('error')}")
+            return False
+        
+        try:
+            await asyncio.to_thread(os.remove, result["save_file"])
+        except OSError:
+            pass
+        return True
+    
+    async def _log_startup_line(self, line: str):
+        print(f"[model_worker] {line}")
+    
+    async def stop(self):
+        """Stop the model worker"""
+        await self.worker.stop()
+        self.model_initialized = False
+        
+        for mapping in self._prefetched.values():
+            mapping.close()
+        self._prefetched.clear()
     
     async def process_video(
         self,
@@ -27,7 +390,8 @@ class VideoProcessor:
         output_path: str,
         request_id: str,
         prompt: str = None,
-        progress_callback: Optional[Callable[[str], Any]] = None
+        progress_callback: Optional[Callable[[str], Any]] = None,
+        on_gpu_start: Optional[Callable[[], Any]] = None
     ) -> bool:
         """
         Process video generation using InfiniteTalk with lightx2v LoRA
@@ -38,6 +402,7 @@ class VideoProcessor:
             output_path: Path to save generated video
             request_id: Unique request identifier
             progress_callback: Function to call with progress updates
+            on_gpu_start: Coroutine called when the job gets the model worker
             
         Returns:
             bool: True if successful, False otherwise
@@ -47,140 +412,83 @@ class VideoProcessor:
             if progress_callback:
                 await progress_callback("Preparing input files...")
             
-            # Create temporary JSON config for this request
-            config_path = os.path.join(self.infinitetalk_dir, f"api/uploads/{request_id}_config.json")
-            
-            # Convert paths to relative paths from InfiniteTalk root directory
-            rel_image_path = os.path.relpath(image_path, self.infinitetalk_dir)
-            rel_audio_path = os.path.relpath(audio_path, self.infinitetalk_dir)
+            # The worker resolves paths independently of our working
+            # directory; joining leaves already absolute paths unchanged
+            cwd = os.getcwd()
             
-            # Create config similar to single_example_image.json
+            # Input config similar to single_example_image.json, sent to the
+            # worker inline with the job instead of through a temp file
             config = {
-                "prompt": prompt or "A person speaking naturally with clear lip sync and facial expressions, professional video quality with natural lighting and smooth motion",
-                "cond_video": rel_image_path,
+                "prompt": prompt or DEFAULT_PROMPT,
+                "cond_video": os.path.join(cwd, image_path),
                 "cond_audio": {
-                    "person1": rel_audio_path
+                    "person1": os.path.join(cwd, audio_path)
                 }
             }
             
-            with open(config_path, 'w') as f:
-                json.dump(config, f, indent=2)
+            # Prep stage: warm the inputs while an earlier job may still hold
+            # the GPU, so the worker reads them from the page cache
+            await asyncio.to_thread(_warm_inputs, [image_path, audio_path])
             
-            if progress_callback:
-                await progress_callback("Starting InfiniteTalk model...")
-            
-            # Make sure config path is relative to the working directory
-            relative_config_path = f"api/uploads/{request_id}_config.json"
-            relative_output_path = f"api/{output_path.replace('.mp4', '')}"
+            if not self._weights_ready.is_set():
+                if progress_callback:
+                    await progress_callback("Waiting for model weights to be cached...")
+                await self._weights_ready.wait()
+            if self._weights_error:
+                if progress_callback:
+                    await progress_callback(f"Error: {self._weights_error}")
+                return False
             
-            # Prepare the command
-            cmd = [
-                self.python_env,
-                "generate_infinitetalk.py",
-                "--ckpt_dir", "weights/Wan2.1-I2V-14B-480P",
-                "--wav2vec_dir", "weights/chinese-wav2vec2-base",
-                "--infinitetalk_dir", "weights/InfiniteTalk/single/infinitetalk.safetensors",
-                "--lora_dir", "weights/lightx2v_lora.safetensors",
-                "--input_json", relative_config_path,
-                "--lora_scale", "1.0",
-                "--size", "infinitetalk-480",
-                "--sample_text_guide_scale", "1.0",
-                "--sample_audio_guide_scale", "2.0",
-                "--sample_steps", "6",  # lightx2v 4-step acceleration
-                "--mode", "streaming",
-                "--motion_frame", "9",
-                "--sample_shift", "2",
-                "--num_persistent_param_in_dit", "0",
-                "--save_file", relative_output_path
-            ]
+            if progress_callback and self.worker.is_busy():
+                await progress_callback("Waiting for GPU...")
             
             if progress_callback:
-                await progress_callback("Loading models (T5, VAE, CLIP, DiT)...")
-            
-            # Run the process
-            process = await asyncio.create_subprocess_exec(
-                *cmd,
-                cwd=str(self.infinitetalk_dir),
-                stdout=asyncio.subprocess.PIPE,
-                stderr=asyncio.subprocess.PIPE,
-                env=dict(os.environ, PYTHONPATH=str(self.infinitetalk_dir))
-            )
-            
-            # Monitor progress
-            progress_messages = [
-                ("loading weights/Wan2.1-I2V-14B-480P/models_t5_umt5-xxl-enc-bf16.pth", "Loading T5 text encoder..."),
-                ("loading weights/Wan2.1-I2V-14B-480P/Wan2.1_VAE.pth", "Loading VAE decoder..."),
-                ("loading weights/Wan2.1-I2V-14B-480P/models_clip", "Loading CLIP vision encoder..."),
-                ("Creating WanModel", "Loading 14B DiT transformer..."),
-                ("Loading LoRA weights", "Applying lightx2v LoRA..."),
-                ("Applied LoRA", "lightx2v LoRA applied successfully"),
-                ("Generating video", "Starting video generation..."),
-                ("No conversion needed", "Processing audio embedding..."),
-                ("Video generation completed", "Video generation completed!")
-            ]
+                await progress_callback("Starting InfiniteTalk model...")
             
-            # Read output line by line
-            async def read_output():
-                if process.stdout:
-                    async for line in process.stdout:
-                        line_str = line.decode().strip()
-                        
-                        # Check for progress indicators
-                        for trigger, message in progress_messages:
-                            if trigger in line_str:
-                                if progress_callback:
-                                    await progress_callback(message)
-                                break
-                        
-                        # Log the line for debugging
-                        print(f"[{request_id}] {line_str}")
+            # The generator appends .mp4 to save_file itself
+            abs_output_stem = os.path.join(cwd, output_path[:-4] if output_path.endswith('.mp4') else output_path)
             
-            # Start reading output
-            output_task = asyncio.create_task(read_output())
+            if progress_callback and not self.worker.is_alive():
+                await progress_callback("Loading models (T5, VAE, CLIP, DiT)...")
             
-            # Wait for process to complete
-            await process.wait()
+            # Handle the worker's output line by line
+            async def read_output(line_str: str):
+                # Check for progress indicators
+                match = PROGRESS_PATTERN.search(line_str)
+                if match and progress_callback:
+                    await progress_callback(PROGRESS_MESSAGES[match.group()])
+                
+                # Log the line for debugging
+                print(f"[{request_id}] {line_str}")
             
-            # Wait for output reading to complete
-            await output_task
+            # Run the job on the resident model worker
+            result = await self.worker.run(
+                {"input_data": config, "save_file": abs_output_stem},
+                line_callback=read_output,
+                on_start=on_gpu_start
+            )
+            self.cuda_memory = result.get("cuda_memory") or self.cuda_memory
             
-            # Check if process was successful
-            if process.returncode == 0:
-                # Check if output file was created
-                expected_output = f"{output_path.replace('.mp4', '')}.mp4"
-                if os.path.exists(expected_output):
-                    # Move to final location if needed
-                    if expected_output != output_path:
-                        os.rename(expected_output, output_path)
-                    
-                    if progress_callback:
-                        await progress_callback("Video generation completed successfully!")
-                    
-                    # Cleanup temporary files
-                    try:
-                        os.remove(config_path)
-                        os.remove(image_path)
-                        os.remove(audio_path)
-                    except:
-                        pass
-                    
-                    return True
-                else:
-                    if progress_callback:
-                        await progress_callback("Error: Output file not created")
-                    return False
-            else:
-                # Read error output
-                error_msg = "Process failed"
-                if process.stderr:
+            # Check if the job was successful
+            if result["ok"]:
+                # The worker reports where it wrote the video, so there's no
+                # need to probe the filesystem; only move it if it differs
+                saved_file = result["save_file"]
+                if saved_file != os.path.join(cwd, output_path):
                     try:
-                        error_output = await process.stderr.read()
-                        error_msg = error_output.decode().strip()
-                        if not error_msg:
-                            error_msg = f"Process exited with code {process.returncode}"
-                    except:
-                        error_msg = f"Process exited with code {process.returncode}"
+                        # Atomic on the same filesystem, replaces a stale file
+                        await asyncio.to_thread(os.replace, saved_file, output_path)
+                    except FileNotFoundError:
+                        if progress_callback:
+                            await progress_callback("Error: Output file not created")
+                        return False
+                
+                if progress_callback:
+                    await progress_callback("Video generation completed successfully!")
                 
+                return True
+            else:
+                error_msg = result.get("error") or "Process failed"
                 print(f"[{request_id}] Error: {error_msg}")
                 
                 if progress_callback:
@@ -195,22 +503,26 @@ class VideoProcessor:
             return False
     
     def is_model_ready(self) -> bool:
-        """Check if model files are available"""
-        required_files = [
-            "weights/Wan2.1-I2V-14B-480P/models_t5_umt5-xxl-enc-bf16.pth",
-            "weights/Wan2.1-I2V-14B-480P/Wan2.1_VAE.pth", 
-            "weights/Wan2.1-I2V-14B-480P/models_clip_open-clip-xlm-roberta-large-vit-huge-14.pth",
-            "weights/chinese-wav2vec2-base",
-            "weights/InfiniteTalk/single/infinitetalk.safetensors",
-            "weights/lightx2v_lora.safetensors"
-        ]
+        """Check if model files are available (cached for MODEL_READY_TTL seconds)"""
+        now = time.monotonic()
+        if self._model_ready is not None and now - self._model_ready_checked < MODEL_READY_TTL:
+            return self._model_ready
         
-        for file_path in required_files:
-            full_path = self.infinitetalk_dir / file_path
-            if not full_path.exists():
-                return False
+        ready = True
+        for directory, names in self._required_by_dir.items():
+            try:
+                with os.scandir(directory) as it:
+                    present = {entry.name for entry in it}
+            except FileNotFoundError:
+                ready = False
+                break
+            if not names <= present:
+                ready = False
+                break
         
-        return True
+        self._model_ready = ready
+        self._model_ready_checked = now
+        return ready
     
     def get_model_info(self) -> dict:
         """Get information about the model setup"""
@@ -220,5 +532,10 @@ class VideoProcessor:
             "sample_steps": 4,
             "resolution": "480p",
             "mode": "streaming",
-            "offload_enabled": True
+            "offload_enabled": True,
+            "dit_dtype": self.dit_quant or "bf16",
+            "t5_dtype": self.dit_quant or "bf16",
+            "streaming_budget_gb": self.streaming_budget_gb,
+            "cuda_alloc_conf": self.cuda_alloc_conf,
+            "cuda_memory": self.cuda_memory
         }
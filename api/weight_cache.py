@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Local disk cache of model weights for InfiniteTalk
+"""
+
+import os
+import glob
+import json
+import time
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List
+
+class WeightCache:
+    """Local mirror of weights/ for slow or network-mounted storage, LRU-evicted"""
+
+    def __init__(self, source_dir: str, cache_dir: str, max_bytes: int):
+        self.source_dir = source_dir
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self._index_path = os.path.join(cache_dir, "index.json")
+
+    def _load_index(self) -> Dict[str, Dict[str, float]]:
+        try:
+            with open(self._index_path, "r") as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return {}
+
+    def _save_index(self, index: Dict[str, Dict[str, float]]):
+        tmp = f"{self._index_path}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(index, f, indent=2)
+        os.replace(tmp, self._index_path)
+
+    def _expand(self, patterns: List[str]) -> List[str]:
+        """Resolve glob patterns and directories to file paths relative to source_dir"""
+        files = []
+        for pattern in patterns:
+            for match in glob.glob(os.path.join(self.source_dir, pattern)):
+                if os.path.isdir(match):
+                    for root, _, names in os.walk(match):
+                        files.extend(os.path.join(root, name) for name in names)
+                else:
+                    files.append(match)
+        return [os.path.relpath(path, self.source_dir) for path in files]
+
+    def _sync_file(self, rel_path: str) -> int:
+        """Make the cached copy of one file current, returns its size"""
+        src = os.path.join(self.source_dir, rel_path)
+        dst = os.path.join(self.cache_dir, rel_path)
+        src_stat = os.stat(src)
+        try:
+            dst_stat = os.stat(dst)
+            if dst_stat.st_size == src_stat.st_size and dst_stat.st_mtime_ns == src_stat.st_mtime_ns:
+                return src_stat.st_size
+        except FileNotFoundError:
+            pass
+
+        os.makedirs(os.path.dirname(dst), exist_ok=True)
+        tmp = f"{dst}.part"
+        shutil.copyfile(src, tmp)
+        # Carry the source mtime over so the next sync sees the copy as current
+        os.utime(tmp, ns=(src_stat.st_atime_ns, src_stat.st_mtime_ns))
+        os.replace(tmp, dst)
+        print(f"[weight_cache] Cached {rel_path} ({src_stat.st_size / (1 << 30):.2f} GB)")
+        return src_stat.st_size
+
+    def sync(self, patterns: List[str], max_workers: int = 8) -> str:
+        """
+        Bring the cached copies of the matching weights up to date
+
+        Args:
+            patterns: Weight paths or glob patterns relative to source_dir
+            max_workers: Number of files copied in parallel
+
+        Returns:
+            str: The cache directory, laid out like source_dir
+        """
+        os.makedirs(self.cache_dir, exist_ok=True)
+        rel_paths = self._expand(patterns)
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            sizes = list(executor.map(self._sync_file, rel_paths))
+
+        index = self._load_index()
+        now = time.time()
+        for rel_path, size in zip(rel_paths, sizes):
+            index[rel_path] = {"size": size, "last_access": now}
+
+        # Evict files not used by this sync, oldest first
+        in_use = set(rel_paths)
+        total = sum(entry["size"] for entry in index.values())
+        for rel_path in sorted(index, key=lambda p: index[p]["last_access"]):
+            if total <= self.max_bytes:
+                break
+            if rel_path in in_use:
+                continue
+            try:
+                os.remove(os.path.join(self.cache_dir, rel_path))
+            except FileNotFoundError:
+                pass
+            total -= index.pop(rel_path)["size"]
+
+        self._save_index(index)
+        return self.cache_dir
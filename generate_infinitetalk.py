@@ -16,6 +16,7 @@ if not torch.cuda.is_available():
         return 'gloo'
     envs.get_torch_distributed_backend = get_torch_distributed_backend
 import sys
+import copy
 import json
 import warnings
 from datetime import datetime
@@ -73,7 +74,7 @@ def _validate_args(args):
         task], f"Unsupport size {args.size} for task {args.task}, supported sizes are: {', '.join(SUPPORTED_SIZES[args.task])}"
 
 
-def _parse_args():
+def _parse_args(argv=None):
     parser = argparse.ArgumentParser(
         description="Generate a image or video from a text prompt or image using Wan"
     )
@@ -227,6 +228,12 @@ def _parse_args():
         required=False,
         help="Maximum parameter quantity retained in video memory, small number to reduce VRAM required",
     )
+    parser.add_argument(
+        "--vram_reserve_gb",
+        type=float,
+        default=None,
+        help="If --num_persistent_param_in_dit is not given, keep as many DiT parameters in video memory as fit in the free VRAM minus the T5/CLIP encoders and this reserve (GB) for activations.",
+    )
     parser.add_argument(
         "--audio_mode",
         type=str,
@@ -281,8 +288,14 @@ def _parse_args():
         default=None,
         help="Quantization type, must be 'int8' or 'fp8'."
     )
+    parser.add_argument(
+        "--serve",
+        action="store_true",
+        default=False,
+        help="Keep the models loaded and read generation jobs as JSON lines from stdin."
+    )
     
-    args = parser.parse_args()
+    args = parser.parse_args(argv)
 
     _validate_args(args)
 
@@ -334,6 +347,23 @@ def _init_logging(rank):
     else:
         logging.basicConfig(level=logging.ERROR)
 
+# Page-locked host buffer reused for every audio feature upload, so a
+# resident worker doesn't pin fresh memory per request. Grown on demand.
+_pinned_staging = None
+
+def _to_device_pinned(tensor, device):
+    global _pinned_staging
+    if torch.device(device).type != "cuda":
+        return tensor.to(device=device)
+    numel = tensor.numel()
+    if _pinned_staging is None or _pinned_staging.dtype != tensor.dtype or _pinned_staging.numel() < numel:
+        _pinned_staging = torch.empty(numel, dtype=tensor.dtype, pin_memory=True)
+    staging = _pinned_staging[:numel].view(tensor.shape)
+    staging.copy_(tensor)
+    # Safe to reuse the buffer next time: the caller's .cpu() on the encoder
+    # output synchronizes with this copy on the same stream
+    return staging.to(device=device, non_blocking=True)
+
 def get_embedding(speech_array, wav2vec_feature_extractor, audio_encoder, sr=16000, device=get_device()):
     audio_duration = len(speech_array) / sr
     video_length = audio_duration * 25 # Assume the video fps is 25
@@ -342,7 +372,7 @@ def get_embedding(speech_array, wav2vec_feature_extractor, audio_encoder, sr=160
     audio_feature = np.squeeze(
         wav2vec_feature_extractor(speech_array, sampling_rate=sr).input_values
     )
-    audio_feature = torch.from_numpy(audio_feature).float().to(device=device)
+    audio_feature = _to_device_pinned(torch.from_numpy(audio_feature).float(), device)
     audio_feature = audio_feature.unsqueeze(0)
 
     # audio encoder
@@ -468,7 +498,30 @@ def process_tts_multi(text, save_dir, voice1, voice2):
     # sum, _ = librosa.load(save_path_sum, sr=16000)
     return s1, s2, save_path_sum
 
-def generate(args):
+def _module_bytes(module):
+    return sum(p.numel() * p.element_size() for p in module.parameters())
+
+def _persistent_params_for_free_vram(wan_i2v, device, reserve_gb, t5_cpu):
+    free_bytes, _ = torch.cuda.mem_get_info(device)
+    # Encoders that sit on the CPU here (T5 is loaded there; CLIP is built on
+    # the GPU, so free_bytes already excludes it) are moved onto the GPU for
+    # every request while the resident DiT layers stay put
+    encoders = [wan_i2v.clip.model]
+    if not t5_cpu:
+        encoders.append(wan_i2v.text_encoder.model)
+    onload_bytes = sum(
+        _module_bytes(module) for module in encoders
+        if next(module.parameters()).device.type == "cpu")
+    bytes_per_param = next(iter(wan_i2v.model.parameters())).element_size()
+    total_params = sum(p.numel() for p in wan_i2v.model.parameters())
+    budget_bytes = free_bytes - onload_bytes - reserve_gb * (1 << 30)
+    num_params = max(0, int(budget_bytes) // bytes_per_param)
+    logging.info(
+        f"{free_bytes / (1 << 30):.1f} GB VRAM free, {onload_bytes / (1 << 30):.1f} GB needed for T5/CLIP, keeping "
+        f"{min(num_params, total_params) / 1e9:.2f}B of {total_params / 1e9:.2f}B DiT parameters resident")
+    return num_params
+
+def load_models(args):
     rank = int(os.getenv("RANK", 0))
     world_size = int(os.getenv("WORLD_SIZE", 1))
     local_rank = int(os.getenv("LOCAL_RANK", 0))
@@ -555,17 +608,23 @@ def generate(args):
         dit_path=args.dit_path,
         infinitetalk_dir=args.infinitetalk_dir
     )
+    if args.num_persistent_param_in_dit is None and args.vram_reserve_gb is not None and torch.cuda.is_available():
+        args.num_persistent_param_in_dit = _persistent_params_for_free_vram(
+            wan_i2v, device, args.vram_reserve_gb, args.t5_cpu)
     if args.num_persistent_param_in_dit is not None:
         wan_i2v.vram_management = True
         wan_i2v.enable_vram_management(
             num_persistent_param_in_dit=args.num_persistent_param_in_dit
         )
-    
-    generated_list = []
-    with open(args.input_json, 'r', encoding='utf-8') as f:
-        input_data = json.load(f)
         
     wav2vec_feature_extractor, audio_encoder= custom_init('cpu', args.wav2vec_dir)
+    return wan_i2v, wav2vec_feature_extractor, audio_encoder
+
+def generate_from_input(args, models, input_data):
+    rank = int(os.getenv("RANK", 0))
+    wan_i2v, wav2vec_feature_extractor, audio_encoder = models
+    
+    generated_list = []
     args.audio_save_dir = os.path.join(args.audio_save_dir, input_data['cond_video'].split('/')[-1].split('.')[0])
     os.makedirs(args.audio_save_dir,exist_ok=True)
     
@@ -673,8 +732,69 @@ def generate(args):
    
     logging.info(f"Saving generated video to {args.save_file}.mp4")  
     logging.info("Finished.")
+    return f"{args.save_file}.mp4"
+
+def generate(args):
+    models = load_models(args)
+    with open(args.input_json, 'r', encoding='utf-8') as f:
+        input_data = json.load(f)
+    return generate_from_input(args, models, input_data)
+
+def cuda_memory_stats():
+    """Caching allocator counters for the current device, None without CUDA."""
+    if not torch.cuda.is_available():
+        return None
+    stats = torch.cuda.memory_stats()
+    return {
+        "allocated_bytes": stats.get("allocated_bytes.all.current", 0),
+        "reserved_bytes": stats.get("reserved_bytes.all.current", 0),
+        "peak_reserved_bytes": stats.get("reserved_bytes.all.peak", 0),
+        "inactive_split_bytes": stats.get("inactive_split_bytes.all.current", 0),
+        "alloc_retries": stats.get("num_alloc_retries", 0),
+        "ooms": stats.get("num_ooms", 0),
+    }
+
+def serve(args):
+    """
+    Load the models once, then run one generation per JSON line on stdin.
+
+    Each job is {"input_data": {...}, "save_file": ...}, where input_data
+    has the same layout as an --input_json file (or "input_json" gives the
+    path of one); any other keys override the matching command line
+    arguments for that job only. After
+    each job a single result line is written to stdout:
+    ``WORKER_RESULT {"ok": true, "save_file": ...}`` or
+    ``WORKER_RESULT {"ok": false, "error": ...}``, both with the
+    allocator counters from cuda_memory_stats() under "cuda_memory".
+    """
+    assert int(os.getenv("WORLD_SIZE", 1)) == 1, "--serve only supports a single process."
+    models = load_models(args)
+    print("WORKER_READY", flush=True)
+
+    for line in sys.stdin:
+        if not line.strip():
+            continue
+        job_args = copy.copy(args)
+        try:
+            job = json.loads(line)
+            input_data = job.pop("input_data", None)
+            for key, value in job.items():
+                setattr(job_args, key, value)
+            if input_data is None:
+                with open(job_args.input_json, 'r', encoding='utf-8') as f:
+                    input_data = json.load(f)
+            save_file = generate_from_input(job_args, models, input_data)
+            result = {"ok": True, "save_file": save_file}
+        except Exception as e:
+            logging.exception("Generation job failed")
+            result = {"ok": False, "error": f"{type(e).__name__}: {e}"}
+        result["cuda_memory"] = cuda_memory_stats()
+        print(f"WORKER_RESULT {json.dumps(result)}", flush=True)
 
 
 if __name__ == "__main__":
     args = _parse_args()
-    generate(args)
+    if args.serve:
+        serve(args)
+    else:
+        generate(args)